@@ -9,39 +9,125 @@ summaries for newly discovered articles to Twitter.
 from __future__ import annotations
 
 import argparse
+import collections
+import copy
+import functools
+import itertools
 import json
 import logging
 import os
+import random
+import re
 import sys
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Mapping, MutableMapping, Optional
-
-import tweepy
-from eventregistry import (
-    ArticleInfoFlags,
-    EventRegistry,
-    GetRecentArticles,
-    QueryArticles,
-    ReturnInfo,
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    MutableMapping,
+    NamedTuple,
+    Optional,
+    TYPE_CHECKING,
 )
 
+if TYPE_CHECKING:  # pragma: no cover - imported lazily at runtime
+    import tweepy
+    from eventregistry import EventRegistry, GetRecentArticles, ReturnInfo
+
+try:  # pragma: no cover - optional dependency
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
 LOGGER = logging.getLogger(__name__)
 DEFAULT_QUERY = "bitcoin mining"
 MAX_TWEET_LENGTH = 280
+SUMMARY_LENGTH = 160
 POSTED_HISTORY_LIMIT = 250
+TWEET_POST_WORKERS = 4
+# Event Registry recomputes the minute stream once a minute; polling more
+# often only re-downloads the same results.
+MIN_POLL_INTERVAL = 60
+# The SDK retries failed requests forever by default, sleeping 5 seconds per
+# attempt; give up sooner and let the next poll pick up from the checkpoints.
+EVENT_REGISTRY_RETRY_COUNT = 2
+# Quiet --loop cycles back off to at most this multiple of the poll interval.
+POLL_BACKOFF_FACTOR = 4
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Article fields read by the keyword filter and the tweet formatter; activity
+# items that already carry all of them do not need to be enriched.
+ENRICHED_ARTICLE_FIELDS = ("title", "body", "url", "concepts")
+# Number of enriched articles remembered across --loop polls.
+ENRICHMENT_CACHE_LIMIT = 1024
+# Event Registry returns at most 100 articles per getArticles call.
+ENRICHMENT_BATCH_SIZE = 100
 
 UPDATES_AFTER_PARAMS: Mapping[str, str] = {
     "recentActivityArticlesNewsUpdatesAfterUri": "updatesAfterNewsUri",
     "recentActivityArticlesBlogsUpdatesAfterUri": "updatesAfterBlogUri",
     "recentActivityArticlesPrUpdatesAfterUri": "updatesAfterPrUri",
 }
+DEFAULT_STATE: Mapping[str, Any] = {
+    "updatesAfterNewsUri": None,
+    "updatesAfterBlogUri": None,
+    "updatesAfterPrUri": None,
+    "postedArticleUris": [],
+}
 
 
 class BotConfigurationError(RuntimeError):
     """Raised when a required configuration value is missing."""
 
 
+class CycleResult(NamedTuple):
+    """Outcome of a single :func:`run_once` poll/post cycle."""
+
+    found_articles: bool
+    state_changed: bool
+
+
+def encode_state(state: Mapping[str, Any], *, pretty: bool = True) -> bytes:
+    """Serialise ``state`` to JSON bytes.
+
+    ``pretty`` output is indented and key-sorted for readable diffs; otherwise
+    the document is compact and keeps insertion order. Non-ASCII text is
+    written as UTF-8 rather than ``\\u`` escapes. ``orjson`` is used when
+    installed; it produces the same document as the standard library encoder,
+    only faster.
+    """
+
+    if orjson is not None:
+        if pretty:
+            return orjson.dumps(
+                state, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+            )
+        return orjson.dumps(state)
+    if pretty:
+        text = json.dumps(state, indent=2, sort_keys=True, ensure_ascii=False)
+    else:
+        text = json.dumps(state, separators=(",", ":"), ensure_ascii=False)
+    return text.encode("utf-8")
+
+
+def decode_state(raw: bytes) -> Any:
+    """Parse JSON ``raw`` bytes, preferring ``orjson`` when installed.
+
+    ``orjson.JSONDecodeError`` subclasses :class:`json.JSONDecodeError`, so
+    callers only need to handle the latter.
+    """
+
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
 def load_state(path: Path) -> Dict[str, Any]:
     """Load persisted state from ``path``.
 
@@ -50,33 +136,58 @@ def load_state(path: Path) -> Dict[str, Any]:
     ``postedArticleUris`` keys.
     """
 
-    if not path.exists():
-        return {
-            "updatesAfterNewsUri": None,
-            "updatesAfterBlogUri": None,
-            "updatesAfterPrUri": None,
-            "postedArticleUris": [],
-        }
-
     try:
-        with path.open("r", encoding="utf-8") as handle:
-            data = json.load(handle)
+        data = decode_state(path.read_bytes())
+    except FileNotFoundError:
+        data = {}
     except (OSError, json.JSONDecodeError) as exc:  # pragma: no cover - defensive
         raise RuntimeError(f"Failed to load bot state from {path}: {exc}") from exc
 
-    data.setdefault("updatesAfterNewsUri", None)
-    data.setdefault("updatesAfterBlogUri", None)
-    data.setdefault("updatesAfterPrUri", None)
-    data.setdefault("postedArticleUris", [])
-    return data
+    # Deep copy so callers never share the default URI list.
+    state = copy.deepcopy(DEFAULT_STATE)
+    state.update(data)
+    return state
+
 
+def fsync_directory(path: Path) -> None:
+    """Flush the directory entry for ``path`` so a rename survives a crash.
 
-def save_state(path: Path, state: MutableMapping[str, Any]) -> None:
-    """Persist the state dictionary to ``path``."""
+    Directories cannot be opened for syncing on Windows, where this is a
+    no-op.
+    """
+
+    if not hasattr(os, "O_DIRECTORY"):  # pragma: no cover - non-POSIX
+        return
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
 
+
+def save_state(
+    path: Path, state: MutableMapping[str, Any], *, pretty: bool = True
+) -> None:
+    """Persist the state dictionary to ``path``.
+
+    The payload is serialised up front and written to a sibling temporary
+    file which then replaces ``path``, so an interrupted write never leaves a
+    truncated state file behind. See :func:`encode_state` for ``pretty``.
+    """
+
+    payload = encode_state(state, pretty=pretty)
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as handle:
-        json.dump(state, handle, indent=2, sort_keys=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    try:
+        with tmp_path.open("wb") as handle:
+            handle.write(payload)
+            handle.flush()
+            os.fsync(handle.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    fsync_directory(path.parent)
 
 
 def resolve_event_registry_api_key() -> str:
@@ -103,27 +214,42 @@ def create_event_registry(api_key: str) -> EventRegistry:
         raise BotConfigurationError(
             "EVENT_REGISTRY_API_KEY is required to connect to Event Registry."
         )
+    # The SDKs are imported on first use so ``--help`` and dry runs without
+    # Twitter credentials do not pay for loading them.
+    from eventregistry import EventRegistry
+
     LOGGER.debug("Initialising EventRegistry client")
-    return EventRegistry(apiKey=api_key)
+    return EventRegistry(
+        apiKey=api_key,
+        repeatFailedRequestCount=EVENT_REGISTRY_RETRY_COUNT,
+    )
 
 
-def create_twitter_client(*, allow_missing: bool = False) -> Optional[tweepy.Client]:
+def create_twitter_client(
+    *,
+    allow_missing: bool = False,
+    env: Optional[Mapping[str, str]] = None,
+) -> Optional[tweepy.Client]:
     """Create and configure the Tweepy client.
 
     When ``allow_missing`` is ``True`` the function returns ``None`` instead of
     raising :class:`BotConfigurationError` if required credentials are
     unavailable. This is primarily used for ``--dry-run`` executions where the
-    Twitter client is not required to post updates.
+    Twitter client is not required to post updates. Credentials are read from
+    ``env``, which defaults to :data:`os.environ`.
     """
 
-    bearer_token = os.getenv("TWITTER_BEARER_TOKEN")
-    api_key = os.getenv("TWITTER_API_KEY")
-    api_secret = os.getenv("TWITTER_API_SECRET")
-    access_token = os.getenv("TWITTER_ACCESS_TOKEN")
-    access_secret = os.getenv("TWITTER_ACCESS_TOKEN_SECRET")
+    if env is None:
+        env = os.environ
+
+    bearer_token = env.get("TWITTER_BEARER_TOKEN")
+    api_key = env.get("TWITTER_API_KEY")
+    api_secret = env.get("TWITTER_API_SECRET")
+    access_token = env.get("TWITTER_ACCESS_TOKEN")
+    access_secret = env.get("TWITTER_ACCESS_TOKEN_SECRET")
     secret_env_name = "TWITTER_ACCESS_TOKEN_SECRET"
     if not access_secret:
-        legacy_secret = os.getenv("TWITTER_ACCESS_SECRET")
+        legacy_secret = env.get("TWITTER_ACCESS_SECRET")
         if legacy_secret:
             LOGGER.debug(
                 "Using TWITTER_ACCESS_SECRET as fallback for TWITTER_ACCESS_TOKEN_SECRET"
@@ -153,6 +279,8 @@ def create_twitter_client(*, allow_missing: bool = False) -> Optional[tweepy.Cli
             f"Missing Twitter credentials: {joined}. Set the variables before running."
         )
 
+    import tweepy
+
     LOGGER.debug("Initialising Tweepy client")
     return tweepy.Client(
         bearer_token=bearer_token,
@@ -164,8 +292,15 @@ def create_twitter_client(*, allow_missing: bool = False) -> Optional[tweepy.Cli
     )
 
 
+@functools.lru_cache(maxsize=1)
 def build_article_return_info() -> ReturnInfo:
-    """Return a :class:`~eventregistry.ReturnInfo` describing article fields."""
+    """Return a :class:`~eventregistry.ReturnInfo` describing article fields.
+
+    The description never changes, so the instance is built once and shared
+    by every request. Event Registry only reads it when serialising queries.
+    """
+
+    from eventregistry import ArticleInfoFlags, ReturnInfo
 
     return ReturnInfo(
         articleInfo=ArticleInfoFlags(
@@ -189,6 +324,8 @@ def build_recent_articles_request(
 ) -> GetRecentArticles:
     """Prepare a :class:`~eventregistry.GetRecentArticles` request."""
 
+    from eventregistry import GetRecentArticles
+
     kwargs: Dict[str, Any] = {}
     if state.get("updatesAfterNewsUri"):
         kwargs["recentActivityArticlesNewsUpdatesAfterUri"] = state["updatesAfterNewsUri"]
@@ -224,16 +361,17 @@ def sync_updates_after(
             state[state_key] = value
 
 
-def enrich_articles(
+def fetch_article_details(
     er: EventRegistry,
-    activity: Iterable[Mapping[str, Any]],
-) -> List[Dict[str, Any]]:
-    """Fetch enriched article details for the provided activity feed."""
+    uris: List[str],
+) -> Dict[str, Dict[str, Any]]:
+    """Return detailed article payloads for ``uris`` keyed by URI.
 
-    activity_list = list(activity)
-    uris = [item.get("uri") for item in activity_list if item.get("uri")]
-    if not uris:
-        return activity_list
+    An empty mapping is returned when the request fails or the payload is
+    malformed.
+    """
+
+    from eventregistry import QueryArticles
 
     query = QueryArticles.initWithArticleUriList(
         uris,
@@ -243,32 +381,71 @@ def enrich_articles(
         response = er.execQuery(query)
     except Exception as exc:  # pragma: no cover - external API
         LOGGER.error("Failed to enrich articles: %s", exc)
-        return activity_list
-    if not isinstance(response, dict):
+        return {}
+
+    try:
+        return {
+            str(article["uri"]): article
+            for article in response["articles"]["results"]
+            if article.get("uri")
+        }
+    except (KeyError, TypeError, AttributeError):
         LOGGER.warning("Unexpected article enrichment payload from Event Registry")
-        return activity_list
+        return {}
+
+
+def enrich_articles(
+    er: EventRegistry,
+    activity: Iterable[Dict[str, Any]],
+    *,
+    cache: Optional[collections.OrderedDict[str, Dict[str, Any]]] = None,
+) -> List[Dict[str, Any]]:
+    """Fetch enriched article details for the provided activity feed.
+
+    Only items missing one of :data:`ENRICHED_ARTICLE_FIELDS` are looked up,
+    :data:`ENRICHMENT_BATCH_SIZE` URIs per request.
+    When ``cache`` is provided, details fetched in earlier polls are reused
+    and the newest :data:`ENRICHMENT_CACHE_LIMIT` results are kept in it.
+    Detailed fields are merged into the activity items in place and the
+    items are returned in their original order.
+    """
 
-    articles = response.get("articles", {}).get("results", [])
-    if not isinstance(articles, list):
-        LOGGER.warning("Unexpected article results returned during enrichment")
+    activity_list = activity if isinstance(activity, list) else list(activity)
+    uris = [
+        str(uri)
+        for item in activity_list
+        if (uri := item.get("uri"))
+        and not all(field in item for field in ENRICHED_ARTICLE_FIELDS)
+    ]
+    if not uris:
         return activity_list
 
-    detailed_by_uri = {
-        str(article.get("uri")): article
-        for article in articles
-        if isinstance(article, dict) and article.get("uri")
-    }
+    detailed_by_uri: Dict[str, Dict[str, Any]] = {}
+    missing: List[str] = []
+    for uri in uris:
+        cached = cache.get(uri) if cache is not None else None
+        if cached is None:
+            missing.append(uri)
+        else:
+            cache.move_to_end(uri)
+            detailed_by_uri[uri] = cached
+
+    for start in range(0, len(missing), ENRICHMENT_BATCH_SIZE):
+        fetched = fetch_article_details(
+            er, missing[start : start + ENRICHMENT_BATCH_SIZE]
+        )
+        detailed_by_uri.update(fetched)
+        if cache is not None:
+            cache.update(fetched)
+            while len(cache) > ENRICHMENT_CACHE_LIMIT:
+                cache.popitem(last=False)
 
-    enriched: List[Dict[str, Any]] = []
     for item in activity_list:
         uri = item.get("uri")
         detailed = detailed_by_uri.get(str(uri)) if uri is not None else None
         if detailed:
-            merged = {**item, **detailed}
-        else:
-            merged = dict(item)
-        enriched.append(merged)
-    return enriched
+            item.update(detailed)
+    return activity_list
 
 
 def fetch_recent_activity(
@@ -277,8 +454,16 @@ def fetch_recent_activity(
     query: str,
     article_lang: Optional[str],
     state: MutableMapping[str, Any],
-) -> List[Dict[str, Any]]:
-    """Fetch the recent activity list and update ``state`` checkpoints."""
+    enrichment_cache: Optional[collections.OrderedDict[str, Dict[str, Any]]] = None,
+    strict_filter: bool = True,
+) -> Iterator[Dict[str, Any]]:
+    """Fetch the recent activity list and update ``state`` checkpoints.
+
+    Matching articles are yielded lazily so that the keyword filter only runs
+    for as many articles as the caller consumes. With ``strict_filter``
+    disabled the client-side check is skipped and the server-side keyword
+    match is trusted.
+    """
 
     request = build_recent_articles_request(
         er, query=query, article_lang=article_lang, state=state
@@ -289,7 +474,7 @@ def fetch_recent_activity(
         activity = request.getUpdates()
     except Exception as exc:  # pragma: no cover - external API
         LOGGER.error("Failed to fetch recent activity: %s", exc)
-        return []
+        return iter(())
 
     if not isinstance(activity, list):
         LOGGER.warning("Unexpected activity payload returned by Event Registry")
@@ -299,65 +484,78 @@ def fetch_recent_activity(
 
     if not activity:
         LOGGER.info("No recent activity returned by Event Registry")
-        return []
+        return iter(())
 
-    enriched = enrich_articles(er, activity)
+    enriched = enrich_articles(er, activity, cache=enrichment_cache)
     LOGGER.info("Retrieved %d enriched articles from recent activity", len(enriched))
-    return [
+    if not strict_filter:
+        return iter(enriched)
+    return (
         article
         for article in enriched
         if is_bitcoin_mining_article(article, query=query)
-    ]
+    )
 
 
 def is_bitcoin_mining_article(article: Dict[str, Any], *, query: str) -> bool:
     """Return ``True`` if the article appears to reference Bitcoin mining."""
 
     query_lower = query.lower()
-    fields = [
-        str(article.get("title", "")),
-        str(article.get("body", "")),
-    ]
-    for field in fields:
-        if query_lower in field.lower():
-            return True
-    for concept in article.get("concepts", []) or []:
-        label = concept.get("label", {}).get("eng") if isinstance(concept, dict) else None
-        if label and query_lower in str(label).lower():
+    for key in ("title", "body"):
+        value = article.get(key)
+        if value and query_lower in str(value).lower():
             return True
-    return False
+
+    labels: List[str] = []
+    for concept in article.get("concepts") or ():
+        try:
+            label = concept["label"]["eng"]
+        except (KeyError, TypeError):
+            continue
+        if label:
+            labels.append(str(label))
+
+    # Concept labels are short, so join them and lowercase/scan the result once
+    # instead of once per label. Newlines keep matches from spanning labels.
+    return bool(labels) and query_lower in "\n".join(labels).lower()
 
 
 def format_tweet(article: Dict[str, Any]) -> str:
     """Build a tweet summarising the provided article."""
 
-    title = (article.get("title") or "Untitled article").strip()
-    summary = article.get("body") or ""
+    title = (article.get("title") or "").strip() or "Untitled article"
     url = article.get("url") or article.get("permalink") or ""
+    summary = _WHITESPACE_RE.sub(" ", article.get("body") or "").strip()
+    summary = summary[:SUMMARY_LENGTH].rstrip()
+    text = f"{title} — {summary}" if summary else title
 
-    summary = " ".join(summary.split())
-    if summary:
-        summary = summary[:160].rstrip()
-    text = title
-    if summary:
-        text = f"{title} — {summary}"
+    # Reserve room for " <url>" once and only slice the text when it overflows.
+    available = MAX_TWEET_LENGTH - len(url) - 1 if url else MAX_TWEET_LENGTH
+    if len(text) > available:
+        text = text[: max(0, available - 1)].rstrip()
+        text = (text[:-1] if text.endswith(".") else text) + "…"
 
     if url:
-        candidate = f"{text} {url}".strip()
-    else:
-        candidate = text
+        return f"{text} {url}".strip()
+    return text
 
-    if len(candidate) <= MAX_TWEET_LENGTH:
-        return candidate
 
-    ellipsis = "…"
-    available = MAX_TWEET_LENGTH - len(url) - 1 if url else MAX_TWEET_LENGTH
-    truncated = text[: max(0, available - 1)].rstrip()
-    truncated = truncated[:-1] + ellipsis if truncated.endswith(".") else truncated + ellipsis
+def publish_tweet(twitter_client: tweepy.Client, uri: str, text: str) -> Optional[str]:
+    """Post ``text`` for the article ``uri`` and return the URI on success.
 
-    if url:
-        return f"{truncated} {url}".strip()
-    return truncated
+    Any error is logged and reported as ``None``. Tweepy lets transport
+    errors from ``requests`` (connection resets, timeouts) through unwrapped,
+    and one of those escaping a worker must not stop the other tweets of the
+    cycle from being recorded.
+    """
+
+    LOGGER.info("Posting tweet for article %s", uri)
+    try:
+        twitter_client.create_tweet(text=text)
+    except Exception as exc:
+        LOGGER.error("Failed to post tweet for %s: %s", uri, exc)
+        return None
+    return uri
 
 
 def post_articles(
@@ -366,44 +564,61 @@ def post_articles(
     *,
     state: MutableMapping[str, Any],
     dry_run: bool,
-) -> None:
-    """Post unseen articles to Twitter and update state."""
+    max_workers: int = TWEET_POST_WORKERS,
+    history_limit: int = POSTED_HISTORY_LIMIT,
+) -> bool:
+    """Post unseen articles to Twitter and update state.
+
+    Only the ``history_limit`` most recently posted URIs are remembered.
+    Returns ``True`` when ``state`` was modified.
+    """
 
     if not dry_run and twitter_client is None:
         raise BotConfigurationError(
             "A Twitter client is required when not running in dry-run mode."
         )
 
-    posted_uris: List[str] = list(state.get("postedArticleUris", []))
-    updated_history = False
-    for article in articles:
-        uri = article.get("uri")
-        if not uri:
-            LOGGER.debug("Skipping article without URI: %s", article)
-            continue
-        if uri in posted_uris:
-            LOGGER.debug("Skipping already-posted article %s", uri)
-            continue
-
-        tweet = format_tweet(article)
-        if dry_run:
-            LOGGER.info("[DRY RUN] Would post tweet: %s", tweet)
-            continue
-
-        LOGGER.info("Posting tweet for article %s", uri)
-        try:
-            twitter_client.create_tweet(text=tweet)
-        except tweepy.TweepyException as exc:  # pragma: no cover - external API
-            LOGGER.error("Failed to post tweet for %s: %s", uri, exc)
-            continue
-
-        posted_uris.append(uri)
-        if len(posted_uris) > POSTED_HISTORY_LIMIT:
-            posted_uris = posted_uris[-POSTED_HISTORY_LIMIT:]
-        updated_history = True
-
-    if not dry_run and (updated_history or "postedArticleUris" not in state):
-        state["postedArticleUris"] = posted_uris
+    # The bounded deque keeps the posting order and evicts the oldest URIs on
+    # append; membership checks go through a set.
+    posted_uris = collections.deque(
+        state.get("postedArticleUris", []), maxlen=history_limit
+    )
+    seen_uris = set(posted_uris)
+    queued_uris = set()
+    futures: List[Future[Optional[str]]] = []
+    changed = False
+    # Tweets are submitted to a small thread pool as soon as each article is
+    # accepted, so their HTTP round-trips overlap with each other and with
+    # filtering the rest of the feed. They may therefore reach the timeline
+    # in completion order; futures are collected in feed order to keep the
+    # posted history deterministic.
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            for article in articles:
+                uri = article.get("uri")
+                if not uri:
+                    LOGGER.debug("Skipping article without URI: %s", article)
+                    continue
+                if uri in seen_uris or uri in queued_uris:
+                    LOGGER.debug("Skipping already-posted article %s", uri)
+                    continue
+
+                tweet = format_tweet(article)
+                if dry_run:
+                    LOGGER.info("[DRY RUN] Would post tweet: %s", tweet)
+                    continue
+
+                queued_uris.add(uri)
+                futures.append(pool.submit(publish_tweet, twitter_client, uri, tweet))
+    finally:
+        # Filtering runs while tweets are in flight, so record everything that
+        # went out even when iterating ``articles`` raised part-way through.
+        published = [uri for uri in (future.result() for future in futures) if uri]
+        posted_uris.extend(published)
+        if not dry_run and (published or "postedArticleUris" not in state):
+            state["postedArticleUris"] = list(posted_uris)
+            changed = True
+    return changed
 
 
 def configure_logging(level: str) -> None:
@@ -415,33 +630,93 @@ def configure_logging(level: str) -> None:
     )
 
 
-def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
-    """Parse command-line arguments."""
+def positive_int(value: str) -> int:
+    """``argparse`` type for options that must be at least 1."""
+
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid int value: {value!r}") from None
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def parse_args(
+    argv: Optional[List[str]] = None,
+    *,
+    env: Optional[Mapping[str, str]] = None,
+) -> argparse.Namespace:
+    """Parse command-line arguments, taking defaults from ``env``.
+
+    ``env`` defaults to :data:`os.environ`.
+    """
+
+    if env is None:
+        env = os.environ
 
     parser = argparse.ArgumentParser(description=__doc__)
     parser.add_argument(
         "--query",
-        default=os.getenv("BOT_QUERY", DEFAULT_QUERY),
+        default=env.get("BOT_QUERY", DEFAULT_QUERY),
         help="Keyword used to filter Bitcoin mining news (default: %(default)s)",
     )
+    parser.add_argument(
+        "--strict-filter",
+        action=argparse.BooleanOptionalAction,
+        default=env.get("BOT_STRICT_FILTER", "1").lower() not in {"0", "false", "no"},
+        help="Re-check that each article mentions the query before posting; "
+        "disable to trust Event Registry's keyword match (default: %(default)s)",
+    )
     parser.add_argument(
         "--state-file",
-        default=os.getenv(
+        default=env.get(
             "BOT_STATE_PATH", Path(__file__).resolve().parent / "state.json"
         ),
         help="Location of the JSON file used to persist API checkpoints",
     )
     parser.add_argument(
         "--article-lang",
-        default=os.getenv("BOT_ARTICLE_LANG"),
+        default=env.get("BOT_ARTICLE_LANG"),
         help="Restrict Event Registry results to the provided language code",
     )
     parser.add_argument(
         "--poll-interval",
         type=int,
-        default=int(os.getenv("BOT_POLL_INTERVAL", "300")),
+        default=int(env.get("BOT_POLL_INTERVAL", "300")),
         help="Delay in seconds when running in --loop mode (default: %(default)s)",
     )
+    parser.add_argument(
+        "--max-poll-interval",
+        type=int,
+        default=int(env.get("BOT_MAX_POLL_INTERVAL", "0")) or None,
+        help=(
+            "Upper bound in seconds for backing off after cycles without "
+            f"articles (default: {POLL_BACKOFF_FACTOR}x the poll interval)"
+        ),
+    )
+    parser.add_argument(
+        "--poll-splay",
+        type=float,
+        default=float(env.get("BOT_POLL_SPLAY_SECONDS", "0")),
+        help="Random delay in seconds added to each poll (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--posted-history-limit",
+        type=positive_int,
+        # A string default goes through ``type`` too, so the environment
+        # variable is validated like the flag.
+        default=env.get("BOT_POSTED_HISTORY_LIMIT", str(POSTED_HISTORY_LIMIT)),
+        help="Number of posted article URIs remembered for deduplication "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--save-interval",
+        type=float,
+        default=float(env.get("BOT_STATE_SAVE_INTERVAL", "30")),
+        help="Minimum seconds between state file writes in --loop mode "
+        "(default: %(default)s)",
+    )
     parser.add_argument(
         "--loop",
         action="store_true",
@@ -454,7 +729,7 @@ def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
     )
     parser.add_argument(
         "--log-level",
-        default=os.getenv("BOT_LOG_LEVEL", "INFO"),
+        default=env.get("BOT_LOG_LEVEL", "INFO"),
         help="Logging verbosity (default: %(default)s)",
     )
     return parser.parse_args(argv)
@@ -468,22 +743,62 @@ def run_once(
     article_lang: Optional[str],
     state: MutableMapping[str, Any],
     dry_run: bool,
-) -> None:
+    history_limit: int = POSTED_HISTORY_LIMIT,
+    enrichment_cache: Optional[collections.OrderedDict[str, Dict[str, Any]]] = None,
+    strict_filter: bool = True,
+) -> CycleResult:
     """Execute a single poll/post cycle."""
 
+    checkpoints = [state.get(key) for key in UPDATES_AFTER_PARAMS.values()]
     try:
         articles = fetch_recent_activity(
-            er, query=query, article_lang=article_lang, state=state
+            er,
+            query=query,
+            article_lang=article_lang,
+            state=state,
+            enrichment_cache=enrichment_cache,
+            strict_filter=strict_filter,
         )
     except Exception as exc:  # pragma: no cover - external API
         LOGGER.error("Failed to fetch recent activity: %s", exc)
-        return
+        articles = iter(())
+    checkpoints_changed = checkpoints != [
+        state.get(key) for key in UPDATES_AFTER_PARAMS.values()
+    ]
 
-    if not articles:
+    first = next(articles, None)
+    if first is None:
         LOGGER.info("No Bitcoin mining updates found in this cycle")
-        return
+        return CycleResult(found_articles=False, state_changed=checkpoints_changed)
+
+    history_changed = post_articles(
+        twitter_client,
+        itertools.chain((first,), articles),
+        state=state,
+        dry_run=dry_run,
+        history_limit=history_limit,
+    )
+    return CycleResult(
+        found_articles=True, state_changed=checkpoints_changed or history_changed
+    )
+
+
+def next_poll_interval(
+    current: float,
+    *,
+    base: float,
+    maximum: float,
+    found_articles: bool,
+) -> float:
+    """Return the delay before the next poll in ``--loop`` mode.
+
+    Quiet cycles double the delay up to ``maximum``; a cycle that finds
+    articles drops straight back to ``base``.
+    """
 
-    post_articles(twitter_client, articles, state=state, dry_run=dry_run)
+    if found_articles:
+        return base
+    return max(base, min(maximum, current * 2))
 
 
 def main(argv: Optional[List[str]] = None) -> int:
@@ -505,23 +820,76 @@ def main(argv: Optional[List[str]] = None) -> int:
     LOGGER.info("Starting Bitcoin mining news poller")
     LOGGER.debug("Using state file at %s", state_path)
 
+    poll_interval = args.poll_interval
+    if args.loop and poll_interval < MIN_POLL_INTERVAL:
+        LOGGER.warning(
+            "Poll interval of %s seconds is below the Event Registry refresh "
+            "rate; using %s seconds instead",
+            poll_interval,
+            MIN_POLL_INTERVAL,
+        )
+        poll_interval = MIN_POLL_INTERVAL
+    max_poll_interval = max(
+        poll_interval, args.max_poll_interval or poll_interval * POLL_BACKOFF_FACTOR
+    )
+    poll_splay = max(0.0, args.poll_splay)
+    interval = poll_interval
+
+    enrichment_cache: collections.OrderedDict[str, Dict[str, Any]] = (
+        collections.OrderedDict()
+    )
+    # Always write a missing state file once so that callers (such as the
+    # GitHub workflow) can rely on it existing after a run.
+    state_dirty = not state_path.exists()
+    last_saved = float("-inf")
     try:
         while True:
-            run_once(
-                er=er,
-                twitter_client=twitter_client,
-                query=args.query,
-                article_lang=args.article_lang,
-                state=state,
-                dry_run=args.dry_run,
-            )
-            save_state(state_path, state)
+            cycle_started = time.monotonic()
+            try:
+                result = run_once(
+                    er=er,
+                    twitter_client=twitter_client,
+                    query=args.query,
+                    article_lang=args.article_lang,
+                    state=state,
+                    dry_run=args.dry_run,
+                    history_limit=args.posted_history_limit,
+                    enrichment_cache=enrichment_cache,
+                    strict_filter=args.strict_filter,
+                )
+            except BaseException:
+                # A cycle that failed part-way may already have posted tweets
+                # and recorded them; make sure they are written on the way out.
+                state_dirty = True
+                raise
+            state_dirty = state_dirty or result.state_changed
             if not args.loop:
                 break
-            LOGGER.debug("Sleeping for %s seconds", args.poll_interval)
-            time.sleep(max(1, args.poll_interval))
+            # In --loop mode, write compact JSON at most once per save
+            # interval; anything still pending is flushed when the loop exits.
+            if state_dirty and time.monotonic() - last_saved >= args.save_interval:
+                save_state(state_path, state, pretty=False)
+                state_dirty = False
+                last_saved = time.monotonic()
+            elif state_dirty:
+                LOGGER.debug("Deferring state write to %s", state_path)
+            interval = next_poll_interval(
+                interval,
+                base=poll_interval,
+                maximum=max_poll_interval,
+                found_articles=result.found_articles,
+            )
+            # Sleep until a deadline measured from the start of the cycle so
+            # slow cycles do not push every later poll back.
+            deadline = cycle_started + interval + random.uniform(0, poll_splay)
+            delay = max(0.0, deadline - time.monotonic())
+            LOGGER.debug("Sleeping for %.1f seconds", delay)
+            time.sleep(delay)
     except KeyboardInterrupt:
         LOGGER.info("Interrupted by user; exiting.")
+    finally:
+        if state_dirty:
+            save_state(state_path, state, pretty=not args.loop)
 
     return 0
 
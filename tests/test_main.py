@@ -1,9 +1,12 @@
 import json
-import os
+import shutil
 import tempfile
 import unittest
+from collections import OrderedDict, deque
 from pathlib import Path
 
+import tweepy
+
 from bot import main
 from unittest import mock
 
@@ -11,31 +14,86 @@ from unittest import mock
 class FakeEventRegistry:
     def __init__(self, response):
         self.response = response
-        self.requests = []
+        self.requests = deque()
 
     def execQuery(self, query):  # pragma: no cover - simple pass-through
         self.requests.append(query)
         return self.response
 
 
+class FakeRecentArticlesRequest:
+    def __init__(self, activity=(), query_params=None):
+        self.activity = list(activity)
+        self.queryParams = dict(query_params or {})
+
+    def getUpdates(self):  # pragma: no cover - simple pass-through
+        return self.activity
+
+
 class FakeTwitterClient:
-    def __init__(self):
+    def __init__(self, failing=(), error=tweepy.TweepyException):
         self.tweets = []
+        self.failing = set(failing)
+        self.error = error
 
     def create_tweet(self, text):  # pragma: no cover - simple pass-through
+        if any(marker in text for marker in self.failing):
+            raise self.error("rejected")
         self.tweets.append(text)
 
 
 class MainModuleTests(unittest.TestCase):
+    DEFAULT_STATE = {
+        "updatesAfterNewsUri": None,
+        "updatesAfterBlogUri": None,
+        "updatesAfterPrUri": None,
+        "postedArticleUris": [],
+    }
+
+    def run_main(self, state_path, *argv, requests, sleep=None):
+        with mock.patch.object(
+            main, "resolve_event_registry_api_key", return_value="key"
+        ), mock.patch.object(
+            main, "create_event_registry", return_value=FakeEventRegistry(None)
+        ), mock.patch.object(
+            main, "create_twitter_client", return_value=None
+        ), mock.patch.object(
+            main, "build_recent_articles_request", side_effect=requests
+        ), mock.patch.object(
+            main, "configure_logging"
+        ), mock.patch.object(
+            main.time, "sleep", side_effect=sleep
+        ), mock.patch.object(
+            main, "save_state", wraps=main.save_state
+        ) as save_state:
+            exit_code = main.main(["--state-file", str(state_path), "--dry-run", *argv])
+        self.assertEqual(exit_code, 0)
+        return save_state
+
     def test_create_twitter_client_allows_missing_when_requested(self):
-        with mock.patch.dict(os.environ, {}, clear=True):
-            client = main.create_twitter_client(allow_missing=True)
+        client = main.create_twitter_client(allow_missing=True, env={})
         self.assertIsNone(client)
 
     def test_create_twitter_client_requires_credentials_by_default(self):
-        with mock.patch.dict(os.environ, {}, clear=True):
-            with self.assertRaises(main.BotConfigurationError):
-                main.create_twitter_client()
+        with self.assertRaises(main.BotConfigurationError):
+            main.create_twitter_client(env={})
+
+    def test_parse_args_reads_defaults_from_env(self):
+        args = main.parse_args([], env={"BOT_QUERY": "asic", "BOT_STRICT_FILTER": "0"})
+
+        self.assertEqual(args.query, "asic")
+        self.assertFalse(args.strict_filter)
+
+    def test_parse_args_rejects_non_positive_history_limit(self):
+        with mock.patch("sys.stderr"):
+            with self.assertRaises(SystemExit):
+                main.parse_args(["--posted-history-limit", "0"], env={})
+            with self.assertRaises(SystemExit):
+                main.parse_args([], env={"BOT_POSTED_HISTORY_LIMIT": "-5"})
+
+        self.assertEqual(
+            main.parse_args([], env={}).posted_history_limit, main.POSTED_HISTORY_LIMIT
+        )
 
     def test_sync_updates_after_writes_all_known_keys(self):
         state = {
@@ -86,6 +144,46 @@ class MainModuleTests(unittest.TestCase):
         self.assertEqual(enriched[0]["title"], "Detailed")
         self.assertEqual(enriched[0]["body"], "Fresh context")
 
+    def test_enrich_articles_reuses_cached_details(self):
+        response = {"articles": {"results": [{"uri": "uri-1", "title": "Detailed"}]}}
+        er = FakeEventRegistry(response)
+        cache = OrderedDict()
+
+        main.enrich_articles(er, [{"uri": "uri-1"}], cache=cache)
+        enriched = main.enrich_articles(er, [{"uri": "uri-1"}], cache=cache)
+
+        self.assertEqual(len(er.requests), 1)
+        self.assertEqual(enriched[0]["title"], "Detailed")
+
+    def test_enrich_articles_batches_large_uri_lists(self):
+        er = FakeEventRegistry({"articles": {"results": []}})
+        activity = [{"uri": f"uri-{index}"} for index in range(150)]
+
+        main.enrich_articles(er, activity)
+
+        self.assertEqual(len(er.requests), 2)
+        self.assertEqual(
+            [len(query.queryParams["articleUri"]) for query in er.requests],
+            [100, 50],
+        )
+
+    def test_enrich_articles_skips_query_when_fields_are_present(self):
+        er = FakeEventRegistry({"articles": {"results": []}})
+        activity = [
+            {
+                "uri": "uri-1",
+                "title": "Complete",
+                "body": "Already detailed",
+                "url": "https://example.com/complete",
+                "concepts": [],
+            }
+        ]
+
+        enriched = main.enrich_articles(er, activity)
+
+        self.assertEqual(len(er.requests), 0)
+        self.assertEqual(enriched, activity)
+
     def test_enrich_articles_falls_back_on_unexpected_payload(self):
         er = FakeEventRegistry(None)
         activity = [{"uri": "uri-1", "title": "Original"}]
@@ -107,12 +205,72 @@ class MainModuleTests(unittest.TestCase):
             },
         ]
 
-        main.post_articles(client, articles, state=state, dry_run=False)
+        changed = main.post_articles(client, articles, state=state, dry_run=False)
 
+        self.assertTrue(changed)
         self.assertEqual(len(client.tweets), 1)
         self.assertIn("uri-2", state["postedArticleUris"])
         self.assertNotIn("uri-1", client.tweets[0])  # ensure we only posted new URI
 
+    def test_post_articles_only_records_published_articles(self):
+        client = FakeTwitterClient(failing=["Rejected"])
+        state = {"postedArticleUris": []}
+        articles = [
+            {"uri": "uri-1", "title": "First mining update"},
+            {"uri": "uri-2", "title": "Rejected mining update"},
+            {"uri": "uri-3", "title": "Third mining update"},
+            {"uri": "uri-3", "title": "Third mining update"},
+        ]
+
+        main.post_articles(client, articles, state=state, dry_run=False)
+
+        self.assertEqual(len(client.tweets), 2)
+        self.assertEqual(state["postedArticleUris"], ["uri-1", "uri-3"])
+
+    def test_post_articles_records_published_articles_on_transport_errors(self):
+        client = FakeTwitterClient(failing=["Dropped"], error=ConnectionError)
+        state = {"postedArticleUris": []}
+        articles = [
+            {"uri": "uri-1", "title": "Dropped mining update"},
+            {"uri": "uri-2", "title": "Second mining update"},
+            {"uri": "uri-3", "title": "Third mining update"},
+        ]
+
+        changed = main.post_articles(client, articles, state=state, dry_run=False)
+
+        self.assertTrue(changed)
+        self.assertEqual(len(client.tweets), 2)
+        self.assertEqual(state["postedArticleUris"], ["uri-2", "uri-3"])
+
+    def test_post_articles_records_published_articles_when_iteration_fails(self):
+        client = FakeTwitterClient()
+        state = {"postedArticleUris": []}
+
+        def articles():
+            yield {"uri": "uri-1", "title": "First mining update"}
+            yield {"uri": "uri-2", "title": "Second mining update"}
+            raise ValueError("malformed article")
+
+        with self.assertRaises(ValueError):
+            main.post_articles(client, articles(), state=state, dry_run=False)
+
+        self.assertEqual(len(client.tweets), 2)
+        self.assertEqual(state["postedArticleUris"], ["uri-1", "uri-2"])
+
+    def test_post_articles_evicts_oldest_uris_beyond_history_limit(self):
+        client = FakeTwitterClient()
+        state = {"postedArticleUris": ["uri-1", "uri-2"]}
+        articles = [
+            {"uri": "uri-3", "title": "Third mining update"},
+            {"uri": "uri-4", "title": "Fourth mining update"},
+        ]
+
+        main.post_articles(
+            client, articles, state=state, dry_run=False, history_limit=3
+        )
+
+        self.assertEqual(state["postedArticleUris"], ["uri-2", "uri-3", "uri-4"])
+
     def test_post_articles_dry_run_does_not_post_or_update_state(self):
         client = FakeTwitterClient()
         posted = ["uri-1"]
@@ -126,8 +284,9 @@ class MainModuleTests(unittest.TestCase):
             }
         ]
 
-        main.post_articles(client, articles, state=state, dry_run=True)
+        changed = main.post_articles(client, articles, state=state, dry_run=True)
 
+        self.assertFalse(changed)
         self.assertEqual(client.tweets, [])
         self.assertIs(state["postedArticleUris"], posted)
         self.assertEqual(state["postedArticleUris"], ["uri-1"])
@@ -150,28 +309,152 @@ class MainModuleTests(unittest.TestCase):
             main.is_bitcoin_mining_article({"title": "Random", "body": "Irrelevant"}, query="bitcoin mining")
         )
 
+    def test_is_bitcoin_mining_article_checks_concept_labels(self):
+        article = {
+            "title": "Energy markets",
+            "body": "",
+            "concepts": [
+                {"label": {"eng": "Bitcoin"}},
+                {"label": {"eng": "Mining"}},
+                {"label": {"eng": "Bitcoin mining"}},
+            ],
+        }
+
+        self.assertTrue(main.is_bitcoin_mining_article(article, query="bitcoin mining"))
+        article["concepts"] = article["concepts"][:2]
+        self.assertFalse(main.is_bitcoin_mining_article(article, query="bitcoin mining"))
+
+    def test_run_once_skips_keyword_check_without_strict_filter(self):
+        article = {
+            "uri": "uri-1",
+            "title": "Hashrate climbs again",
+            "body": "No keyword here",
+            "url": "https://example.com/hashrate",
+            "concepts": [],
+        }
+        for strict_filter, expected_tweets in ((True, 0), (False, 1)):
+            client = FakeTwitterClient()
+            request = FakeRecentArticlesRequest(activity=[dict(article)])
+            with mock.patch.object(
+                main, "build_recent_articles_request", return_value=request
+            ):
+                result = main.run_once(
+                    er=FakeEventRegistry(None),
+                    twitter_client=client,
+                    query="bitcoin mining",
+                    article_lang=None,
+                    state={"postedArticleUris": []},
+                    dry_run=False,
+                    strict_filter=strict_filter,
+                )
+
+            self.assertEqual(result.found_articles, not strict_filter)
+            self.assertEqual(len(client.tweets), expected_tweets)
+
+    def test_next_poll_interval_backs_off_until_articles_arrive(self):
+        interval = 300
+        for expected in (600, 1200, 1200):
+            interval = main.next_poll_interval(
+                interval, base=300, maximum=1200, found_articles=False
+            )
+            self.assertEqual(interval, expected)
+
+        self.assertEqual(
+            main.next_poll_interval(interval, base=300, maximum=1200, found_articles=True),
+            300,
+        )
+
+    def test_encode_state_matches_stdlib_json(self):
+        state = {"postedArticleUris": ["é-uri"], "updatesAfterNewsUri": "news"}
+        expected = json.dumps(
+            state, indent=2, sort_keys=True, ensure_ascii=False
+        ).encode("utf-8")
+        compact = json.dumps(state, separators=(",", ":"), ensure_ascii=False).encode(
+            "utf-8"
+        )
+
+        self.assertEqual(main.encode_state(state), expected)
+        self.assertEqual(main.encode_state(state, pretty=False), compact)
+        with mock.patch.object(main, "orjson", None):
+            self.assertEqual(main.encode_state(state), expected)
+            self.assertEqual(main.encode_state(state, pretty=False), compact)
+            self.assertEqual(main.decode_state(expected), state)
+
     def test_state_round_trip(self):
-        with tempfile.TemporaryDirectory() as tempdir:
-            path = Path(tempdir) / "state.json"
-            state = main.load_state(path)
-            self.assertEqual(
-                state,
-                {
-                    "updatesAfterNewsUri": None,
-                    "updatesAfterBlogUri": None,
-                    "updatesAfterPrUri": None,
-                    "postedArticleUris": [],
-                },
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir, ignore_errors=True)
+        path = Path(tempdir) / "state.json"
+        state = main.load_state(path)
+        self.assertEqual(state, self.DEFAULT_STATE)
+        self.assertIsNot(
+            state["postedArticleUris"], main.DEFAULT_STATE["postedArticleUris"]
+        )
+
+        state["updatesAfterNewsUri"] = "news"
+        main.save_state(path, state)
+
+        with path.open("r", encoding="utf-8") as handle:
+            saved = json.load(handle)
+
+        self.assertEqual(saved["updatesAfterNewsUri"], "news")
+        self.assertIn("postedArticleUris", saved)
+
+    def test_main_does_not_rewrite_unchanged_state(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir, ignore_errors=True)
+        path = Path(tempdir) / "state.json"
+        main.save_state(path, dict(self.DEFAULT_STATE))
+
+        save_state = self.run_main(path, requests=[FakeRecentArticlesRequest()])
+
+        save_state.assert_not_called()
+
+    def test_main_writes_missing_state_file(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir, ignore_errors=True)
+        path = Path(tempdir) / "state.json"
+
+        save_state = self.run_main(path, requests=[FakeRecentArticlesRequest()])
+
+        self.assertEqual(save_state.call_count, 1)
+        self.assertEqual(main.load_state(path), self.DEFAULT_STATE)
+
+    def test_main_flushes_deferred_state_on_exit(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir, ignore_errors=True)
+        path = Path(tempdir) / "state.json"
+        main.save_state(path, dict(self.DEFAULT_STATE))
+        requests = [
+            FakeRecentArticlesRequest(
+                query_params={"recentActivityArticlesNewsUpdatesAfterUri": uri}
             )
+            for uri in ("news-1", "news-2")
+        ]
+
+        save_state = self.run_main(
+            path,
+            "--loop",
+            "--save-interval",
+            "3600",
+            requests=requests,
+            sleep=[None, KeyboardInterrupt],
+        )
+
+        # The first change is written right away, the second is deferred by
+        # the save interval and flushed when the loop is interrupted.
+        self.assertEqual(save_state.call_count, 2)
+        self.assertEqual(main.load_state(path)["updatesAfterNewsUri"], "news-2")
+        self.assertNotIn(b"\n", path.read_bytes())
 
-            state["updatesAfterNewsUri"] = "news"
-            main.save_state(path, state)
+    def test_load_state_fills_in_missing_keys(self):
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir, ignore_errors=True)
+        path = Path(tempdir) / "state.json"
+        path.write_text(json.dumps({"updatesAfterNewsUri": "news"}), encoding="utf-8")
 
-            with path.open("r", encoding="utf-8") as handle:
-                saved = json.load(handle)
+        state = main.load_state(path)
 
-            self.assertEqual(saved["updatesAfterNewsUri"], "news")
-            self.assertIn("postedArticleUris", saved)
+        self.assertEqual(state, dict(self.DEFAULT_STATE, updatesAfterNewsUri="news"))
 
 
 if __name__ == "__main__":  # pragma: no cover